@@ -13,13 +13,15 @@ class Config:
         self._dhcp = DHCPServerConfiguration()
 
     def _read_environment(self):
-        # Database configuration
-        db_driver = os.environ.get("DB_DRIVER")
-        if db_driver not in ("sqlite", "psql", "cockdb"):
-            raise ValueError("Invalid database driver. Supported: sqlite, psql, cockdb")
-        db_database = os.environ.get("DB_DATABASE")
-        db_host = os.environ.get("DB_HOST")
-        db_port = os.environ.get("DB_PORT")
-        db_username = os.environ.get("DB_USERNAME")
-        db_password = os.environ.get("DB_PASSWORD")
+        env = dict(os.environ)  # snapshot: one traversal instead of a get() per key
+        # Database configuration; the driver is validated once in DataBaseConfiguration.check()
+        db_port = env.get("DB_PORT")
+        self._database = DataBaseConfiguration(
+            driver=env.get("DB_DRIVER"),
+            database=env.get("DB_DATABASE", "nextdhcp.db"),
+            host=env.get("DB_HOST"),
+            port=int(db_port) if db_port else None,
+            user=env.get("DB_USERNAME"),
+            password=env.get("DB_PASSWORD"),
+        )
 
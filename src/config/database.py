@@ -1,7 +1,10 @@
+import functools
 from dataclasses import dataclass
 
 from core import InvalidDatabaseConfiguration
 
+_VALID_DRIVERS = frozenset(("sqlite", "psql", "cockdb"))
+
 @dataclass
 class DataBaseConfiguration:
     """Class for storing the configuration of the database"""
@@ -14,33 +17,26 @@ class DataBaseConfiguration:
 
     def __post_init__(self):
         self.check()
-        if self.driver == "sqlite":
-            from piccolo.engine.sqlite import SQLiteEngine
-            self._engine = SQLiteEngine(self.database)
-        elif self.driver == "psql":
-            from piccolo.engine.postgres import PostgresEngine
-            self._engine = PostgresEngine(config={
-                "database": self.database,
-                "host": self.host,
-                "port": self.port,
-                "user": self.user,
-                "password": self.password,
-            })
-        elif self.driver == "cockdb":
-            from piccolo.engine.cockroach import CockroachEngine
-            self._engine = CockroachEngine(config={
-                "database": self.database,
-                "host": self.host,
-                "port": self.port,
-                "user": self.user,
-                "password": self.password,
-            })
 
     def check(self):
-        if self.driver not in ("sqlite", "psql", "cockdb"):
+        if self.driver not in _VALID_DRIVERS:
             raise InvalidDatabaseConfiguration("Invalid database driver. Supported: sqlite, psql, cockdb")
 
-    @property
+    @functools.cached_property
     def engine(self):
-        """Get the database engine"""
-        return self._engine
+        """Get the database engine (constructed lazily on first access)"""
+        if self.driver == "sqlite":
+            from piccolo.engine.sqlite import SQLiteEngine
+            return SQLiteEngine(self.database)
+        config = {
+            "database": self.database,
+            "host": self.host,
+            "port": self.port,
+            "user": self.user,
+            "password": self.password,
+        }
+        if self.driver == "psql":
+            from piccolo.engine.postgres import PostgresEngine
+            return PostgresEngine(config=config)
+        from piccolo.engine.cockroach import CockroachEngine
+        return CockroachEngine(config=config)
@@ -1,11 +1,14 @@
+import functools
 import ipaddress
 import platform
 import random
 import re
+import socket
+import struct
 import subprocess
+import time
 from dataclasses import dataclass, field
 
-from dhcppython import options
 from loguru import logger
 
 from core.exceptions import InvalidDHCPConfiguration
@@ -18,40 +21,43 @@ def get_range(network):
     return int(first_host), int(last_host)
 
 
+# Interfaces rarely change during a run; cache the subprocess result for a minute
+_interfaces_cache = None
+_interfaces_cache_ts = 0.0
+_INTERFACES_TTL = 60.0
+
 def get_all_interfaces():
+    global _interfaces_cache, _interfaces_cache_ts
+    now = time.monotonic()
+    if _interfaces_cache is not None and now - _interfaces_cache_ts < _INTERFACES_TTL:
+        return _interfaces_cache
     os_type = platform.system()
     try:
         if os_type == "Windows":
-            return get_windows_ips()
+            ips = get_windows_ips()
         elif os_type == "Linux":
-            return get_linux_ips()
+            ips = get_linux_ips()
         else:
             raise NotImplementedError(f"OS '{os_type}' not supported")
     except Exception as e:
         logger.exception(e)
+        return None
+    _interfaces_cache = ips
+    _interfaces_cache_ts = now
+    return ips
+
+# Compiled once at import; matching on bytes avoids decoding the whole output.
+_WINDOWS_IP_RE = re.compile(rb'IPv4 Address[. ]+:\s+([0-9]+\.[0-9]+\.[0-9]+\.[0-9]+)')
+_LINUX_IP_RE = re.compile(rb'inet ([0-9]+\.[0-9]+\.[0-9]+\.[0-9]+)')
 
 def get_windows_ips():
-    ips = []
-    command = "powershell -Command \"& {chcp 437; ipconfig}\""
-    output = subprocess.check_output(command, shell=True)
-    output = output.decode('cp437', errors='ignore')
-    lines = output.splitlines()
-    for line in lines:
-        ip_match = re.search(r'IPv4 Address[. ]+:\s+([0-9]+\.[0-9]+\.[0-9]+\.[0-9]+)', line)
-        if ip_match:
-            ips.append(ip_match.group(1))
-    return ips
+    # Plain ipconfig: going through powershell costs 300-500 ms of startup
+    output = subprocess.check_output("ipconfig", shell=True)
+    return [ip.decode('ascii') for ip in _WINDOWS_IP_RE.findall(output)]
 
 def get_linux_ips():
-    ips = []
-    output = subprocess.check_output(["ip", "addr"], encoding='latin1')
-    lines = output.splitlines()
-    for line in lines:
-        if "inet " in line:
-            ip_match = re.search(r'inet ([0-9]+\.[0-9]+\.[0-9]+\.[0-9]+)', line)
-            if ip_match:
-                ips.append(ip_match.group(1))
-    return ips
+    output = subprocess.check_output(["ip", "addr"])
+    return [ip.decode('ascii') for ip in _LINUX_IP_RE.findall(output)]
 
 @dataclass
 class DHCPServerConfiguration:
@@ -64,6 +70,13 @@ class DHCPServerConfiguration:
     domain_name_servers: set = field(default_factory=lambda: {"1.1.1.1", "8.8.8.8", "9.9.9.9"})
     server_ip: ipaddress.IPv4Address = field(default_factory=lambda: None)
 
+    def __post_init__(self):
+        # Range bounds as plain ints: in_range runs per packet and an integer
+        # compare avoids building IPv4Address objects.
+        self._range_lo, self._range_hi = self.range
+        # str form used on every broadcast
+        self._bcast_str = str(self.network.broadcast_address)
+
     @property
     def dhcp_range_len(self):
         return self.range[1] - self.range[0]
@@ -73,6 +86,7 @@ class DHCPServerConfiguration:
         if self.server_ip is None:
             raise InvalidDHCPConfiguration(f"No valid IPs on any interface (maybe not in DHCP network?)\n{get_all_interfaces()}")
         logger.success(f"Using interface with '{self.server_ip}' for DHCP Server.")
+        self._bcast_str = str(self.network.broadcast_address)
         s, e = ipaddress.IPv4Address(self.range[0]), ipaddress.IPv4Address(self.range[1])
         if s not in self.network or e not in self.network:
             raise InvalidDHCPConfiguration(f"Bad DHCP range: '{s}'-'{e}' not in network")
@@ -81,13 +95,19 @@ class DHCPServerConfiguration:
         if ipaddress.IPv4Address(self.router) not in self.network:
             logger.warning("Router not in network")
 
+    def in_range_int(self, ip_int: int) -> bool:
+        """Fast path: check an already-converted IP against the DHCP range"""
+        return self._range_lo <= ip_int <= self._range_hi
+
     def in_range(self, ip):
-        """Check if an IP address is in the DHCP range"""
-        return ipaddress.ip_address(ip) in self.network
+        """Check if an IP address (str or int) is in the DHCP range"""
+        if not isinstance(ip, int):
+            ip = struct.unpack('!I', socket.inet_aton(str(ip)))[0]
+        return self._range_lo <= ip <= self._range_hi
 
     def random_ip(self):
         """Return a random IP address in the DHCP range"""
-        return str(ipaddress.ip_address(random.randint(*self.range)))
+        return socket.inet_ntoa(struct.pack('!I', random.randint(*self.range)))
 
     def as_dict(self):
         return {
@@ -111,9 +131,14 @@ class DHCPServerConfiguration:
             data['dhcp_range'] = get_range(data['network'])
         return cls(**data)
 
-    @property
+    def invalidate_options(self):
+        """Drop the cached option list after the configuration is edited at runtime"""
+        self.__dict__.pop('options', None)
+
+    @functools.cached_property
     def options(self):
-        """Return the options for the configuration"""
+        """Return the options for the configuration (cached until invalidated)"""
+        from dhcppython import options  # deferred: heavy import, needed only here
         return options.OptionList(
             [
                 # Netmask
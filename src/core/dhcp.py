@@ -1,18 +1,33 @@
 # https://github.com/niccokunzmann/python_dhcp_server
+from __future__ import annotations
 
 import collections
+import functools
 import socket
+import struct
 import time
+from dataclasses import dataclass
 from enum import Enum
 
 import select
-from dhcppython import options
-from dhcppython.packet import DHCPPacket
 from loguru import logger
 
 from .config import DHCPServerConfiguration
 from dhcp.core.database import HostDatabase
 
+# dhcppython parses its full option table at import time (hundreds of ms),
+# so pull it in only when the server actually starts handling packets.
+DHCPPacket = None
+options = None
+
+def _import_dhcppython():
+    global DHCPPacket, options
+    if DHCPPacket is None:
+        from dhcppython import options as _options
+        from dhcppython.packet import DHCPPacket as _DHCPPacket
+        options = _options
+        DHCPPacket = _DHCPPacket
+
 
 # noinspection SpellCheckingInspection
 class DHCPMessages(Enum):
@@ -26,124 +41,181 @@ class DHCPMessages(Enum):
     DHCPINFORM = 8
 
 
+@dataclass(slots=True)
+class ParsedPacket:
+    """Fields extracted from a DHCPPacket in one pass over its option list,
+    so the handlers don't re-scan it with by_code per field."""
+    op: str
+    xid: int
+    chaddr: str
+    ciaddr: "str | None"
+    yiaddr: "str | None"
+    msg_type: "str | None"
+    req_ip: "str | None"
+    hostname: "str | None"
+
+    @classmethod
+    def from_packet(cls, packet: DHCPPacket) -> "ParsedPacket":
+        msg_type = req_ip = hostname = None
+        for option in packet.options:
+            code = option.code
+            if code == 53:
+                msg_type = option.value['dhcp_message_type']
+            elif code == 50:
+                req_ip = option.value.get('requested_ip_address')
+            elif code == 12:
+                hostname = option.value.get('hostname')
+        return cls(packet.op, packet.xid, packet.chaddr, packet.ciaddr, packet.yiaddr,
+                   msg_type, req_ip, hostname)
+
+
 class Session:
 
     def __init__(self, server):
-        self.start = time.time()
+        # monotonic: immune to wall-clock jumps and cheaper on some platforms
+        self._start_mono = time.monotonic()
+        self._elapsed = 0
         self.server: "DHCPServer" = server
         self.configuration = server.conf
         self.packets = []
-        self.timeout = time.time() + 30
+        self.timeout = self._start_mono + 30
+        self.closed = False
+        # one dict hash per packet instead of Enum lookup + match
+        self._dispatch = {
+            "DHCPDISCOVER": self.send_offer,
+            "DHCPREQUEST": self.send_ack,
+        }
+
+    def reset(self):
+        """Reinitialize a pooled session for a new transaction"""
+        self._start_mono = time.monotonic()
+        self._elapsed = 0
+        self.packets.clear()
+        self.timeout = self._start_mono + 30
         self.closed = False
+        return self
 
     def is_done(self):
-        return self.closed or self.timeout < time.time()
+        return self.closed or self.timeout < time.monotonic()
 
     def close(self):
         self.closed = True
 
-    def receive(self, packet: DHCPPacket):
+    def receive(self, packet: ParsedPacket):
         if self.closed:
             return
         if packet.op == "BOOTREQUEST":  # From client
-            message = packet.options.by_code(53)
-            try:
-                dhcp_message = DHCPMessages[message.value['dhcp_message_type']]
-            except KeyError:
-                logger.warning(f"Unknown dhcp_message: {message}")
+            self._elapsed = int(time.monotonic() - self._start_mono)
+            handler = self._dispatch.get(packet.msg_type)
+            if handler is None:
+                logger.warning(f"Unhandled dhcp_message: {packet.msg_type}")
                 return False
-            match dhcp_message:
-                case DHCPMessages.DHCPDISCOVER:
-                    self.send_offer(packet)
-                case DHCPMessages.DHCPREQUEST:
-                    self.send_ack(packet)
-                case _:
-                    logger.warning(f"Unhandled: {dhcp_message}")
-
-    def send_offer(self, packet: DHCPPacket):
+            handler(packet)
+
+    def send_offer(self, packet: ParsedPacket):
         mac = packet.chaddr
-        req_ip = packet.options.by_code(50)
-        if req_ip:
-            req_ip = req_ip.value.get('requested_ip_address')
-        else:
-            req_ip = packet.ciaddr
-        hostname = packet.options.by_code(12)
-        if hostname:
-            hostname = hostname.value.get("hostname")
-        ip = self.server.hosts.find_or_register(mac, req_ip, hostname)
+        req_ip = packet.req_ip if packet.req_ip is not None else packet.ciaddr
+        ip = self.server.hosts.find_or_register(mac, req_ip, packet.hostname)
         if ip == 0:
             return
-        offer = DHCPPacket.Offer(
-            packet.chaddr,
-            int(time.time() - self.start),
-            packet.xid,
-            ip,
-            option_list=self.server.conf.options
-        )
-        offer.siaddr = self.server.conf.dhcp_server_ip
-        self.server.broadcast(offer)
+        self.server.broadcast_reply("DHCPOFFER", packet, ip, self._elapsed)
 
-    def send_ack(self, packet: DHCPPacket):
+    def send_ack(self, packet: ParsedPacket):
         host = self.server.hosts.get(mac=packet.chaddr)
         if host is None:
             logger.error(f"Fail DORA: No host found; MAC: {packet.chaddr}")
             return self.send_nak(packet)
-        req_ip = packet.options.by_code(50)
-        if req_ip:
-            req_ip = req_ip.value.get('requested_ip_address')
-            if host.ip != req_ip:
-                logger.error(f"Fail DORA: IP mismatched {host.ip=} != {req_ip=}; MAC: {packet.chaddr}")
-                return self.send_nak(packet)
-        ack = DHCPPacket.Ack(
-            packet.chaddr,
-            int(time.time() - self.start),
-            packet.xid,
-            host.ip,
-            option_list=self.server.conf.options
-        )
-        ack.siaddr = self.server.conf.dhcp_server_ip
-        self.server.broadcast(ack)
+        if packet.req_ip and host.ip != packet.req_ip:
+            logger.error(f"Fail DORA: IP mismatched {host.ip=} != {packet.req_ip=}; MAC: {packet.chaddr}")
+            return self.send_nak(packet)
+        self.server.broadcast_reply("DHCPACK", packet, host.ip, self._elapsed)
 
-    def send_nak(self, packet: DHCPPacket):
+    def send_nak(self, packet: ParsedPacket):
         nack = DHCPPacket.Ack(
             packet.chaddr,
-            int(time.time() - self.start),
+            self._elapsed,
             packet.xid,
             packet.yiaddr
         )
         nack.siaddr = self.server.conf.dhcp_server_ip
         nack.options = options.OptionList([options.options.short_value_to_object(53, "DHCPNAK")])
-        self.server.broadcast(nack)
+        # the type is known here; don't make broadcast() re-derive it from the options
+        self.server.broadcast_bytes(nack.asbytes, "DHCPNAK", packet.chaddr)
 
 class DHCPServer:
 
     def __init__(self, configuration: DHCPServerConfiguration = None):
         self.conf = configuration or DHCPServerConfiguration()
         self.socket = socket.socket(type=socket.SOCK_DGRAM)
+        # Broadcasts go out through the listening socket: a second socket
+        # bound to (server_ip, 67) would win delivery of unicast DHCPREQUESTs
+        # and relay traffic over the wildcard bind, and _worker never reads it
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        # Reusable receive buffer: recvfrom() would allocate 4 KB per packet
+        self._recv_buf = bytearray(4096)
+        self._recv_view = memoryview(self._recv_buf)
         self.closed = False
-        self.sessions = collections.defaultdict(lambda: Session(self))  # id: sessions
-        self.hosts = HostDatabase(self.conf)
+        self.sessions: dict[int, Session] = {}  # xid: session
+        self._expiry: collections.deque[tuple[float, int]] = collections.deque()  # (timeout, xid) FIFO
+        self._reply_templates: dict[str, bytes] = {}  # msg_type: serialized skeleton
+        self._session_pool: list[Session] = []  # expired sessions kept for reuse
         self.time_started = time.time()
 
     def __str__(self):
         return f"DHCPServer(configuration={self.conf})"
 
+    def invalidate_options(self):
+        """Drop all option-derived caches after a runtime config edit:
+        the config-side OptionList and the serialized reply templates."""
+        self.conf.invalidate_options()
+        self._reply_templates.clear()
+
+    @functools.cached_property
+    def hosts(self):
+        """Host database, created on first access so that constructing a
+        DHCPServer has no DB side effects"""
+        return HostDatabase(self.conf)
+
+    def _reply_template(self, msg_type: str) -> bytes:
+        """Serialize the static part of an offer/ack once; only xid, secs,
+        yiaddr and chaddr differ per client and get patched in afterwards."""
+        template = self._reply_templates.get(msg_type)
+        if template is None:
+            factory = DHCPPacket.Offer if msg_type == "DHCPOFFER" else DHCPPacket.Ack
+            # copy: Offer/Ack insert option 53 into the list they are given,
+            # and conf.options is cached
+            skeleton = factory("00:00:00:00:00:00", 0, 0, "0.0.0.0",
+                               option_list=options.OptionList(list(self.conf.options)))
+            skeleton.siaddr = self.conf.dhcp_server_ip
+            template = self._reply_templates[msg_type] = skeleton.asbytes
+        return template
+
+    def broadcast_reply(self, msg_type: str, packet: ParsedPacket, yiaddr, secs: int) -> None:
+        """Build an offer/ack from the cached template instead of running the
+        full dhcppython serialization per packet."""
+        mac_bytes = bytes.fromhex(packet.chaddr.replace(':', ''))
+        if len(mac_bytes) != 6:
+            # a slice assignment of another length would resize the buffer
+            # and shift every field after chaddr; the template assumes Ethernet
+            logger.warning(f"Not broadcasting {msg_type}: non-Ethernet chaddr '{packet.chaddr}'")
+            return
+        buf = bytearray(self._reply_template(msg_type))
+        struct.pack_into('!IH', buf, 4, packet.xid, secs)  # xid, secs
+        buf[16:20] = socket.inet_aton(str(yiaddr))  # yiaddr
+        buf[28:34] = mac_bytes  # chaddr
+        self.broadcast_bytes(bytes(buf), msg_type, packet.chaddr)
+
     def broadcast(self, packet: DHCPPacket) -> None:
-        logger.info(
-            f"{'broadcasting:':<14}{packet.options.by_code(53).value['dhcp_message_type']:<12}; "
-            f"'srv -> cli'; MAC: {packet.chaddr}"
-        )
-        with socket.socket(type=socket.SOCK_DGRAM) as broadcast_socket:
-            broadcast_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            broadcast_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            try:
-                data = packet.asbytes
-                broadcast_socket.bind((str(self.conf.dhcp_server_ip), 67))
-                broadcast_socket.sendto(data, ('255.255.255.255', 68))
-                broadcast_socket.sendto(data, (str(self.conf.network.broadcast_address), 68))
-            except Exception as e:
-                logger.exception(e)
-                logger.error(f"Failed to broadcast from {self.conf.dhcp_server_ip}: {e}")
+        self.broadcast_bytes(packet.asbytes, packet.msg_type, packet.chaddr)
+
+    def broadcast_bytes(self, data: bytes, msg_type: str, mac: str) -> None:
+        logger.info(f"{'broadcasting:':<14}{msg_type:<12}; 'srv -> cli'; MAC: {mac}")
+        try:
+            self.socket.sendto(data, ('255.255.255.255', 68))
+            self.socket.sendto(data, (self.conf._bcast_str, 68))
+        except Exception as e:
+            logger.exception(e)
+            logger.error(f"Failed to broadcast from {self.conf.dhcp_server_ip}: {e}")
 
     def _worker(self, timeout=0):
         try:
@@ -151,23 +223,39 @@ class DHCPServer:
         except ValueError:  # -1
             return
         for sock in reads:
-            try:
-                packet = DHCPPacket.from_bytes(sock.recvfrom(4096)[0])
-            except OSError:  # An operation was attempted on something that is not a socket
-                pass
-            else:
-                logger.info(f"{'received:':<14}{packet.options.by_code(53).value['dhcp_message_type']:<12}; "
-                            f"{'cli -> srv' if packet.op == 'BOOTREQUEST' else 'srv -> cli'}; MAC: {packet.chaddr}")
-                self.sessions[packet.xid].receive(packet)
-        for transaction_id, transaction in list(self.sessions.items()):
-            if transaction.is_done():
+            # The socket is non-blocking: drain every queued datagram so a
+            # boot-storm burst costs one select instead of one per packet
+            while True:
+                try:
+                    nbytes = sock.recvfrom_into(self._recv_buf, 4096)[0]
+                except BlockingIOError:  # queue drained
+                    break
+                except OSError:  # An operation was attempted on something that is not a socket
+                    break
+                parsed = ParsedPacket.from_packet(DHCPPacket.from_bytes(bytes(self._recv_view[:nbytes])))
+                logger.info(f"{'received:':<14}{parsed.msg_type:<12}; "
+                            f"{'cli -> srv' if parsed.op == 'BOOTREQUEST' else 'srv -> cli'}; MAC: {parsed.chaddr}")
+                if parsed.op == "BOOTREQUEST":  # don't allocate sessions for stray replies
+                    session = self.sessions.get(parsed.xid)
+                    if session is None:
+                        session = self._session_pool.pop().reset() if self._session_pool else Session(self)
+                        self.sessions[parsed.xid] = session
+                        self._expiry.append((session.timeout, parsed.xid))
+                    session.receive(parsed)
+        now = time.monotonic()
+        while self._expiry and self._expiry[0][0] < now:
+            _, transaction_id = self._expiry.popleft()
+            transaction = self.sessions.pop(transaction_id, None)
+            if transaction is not None:
                 transaction.close()
-                self.sessions.pop(transaction_id)
+                self._session_pool.append(transaction)
 
     def start(self):
+        _import_dhcppython()
         logger.success("Started")
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.socket.bind(("0.0.0.0", 67))
+        self.socket.setblocking(False)  # _worker drains until BlockingIOError
         while not self.closed:
             try:
                 self._worker(1)
@@ -178,12 +266,15 @@ class DHCPServer:
 
     def stop(self, *_, **__):
         self.closed = True
-        self.hosts.run = False
+        hosts = self.__dict__.get("hosts")  # don't build the DB just to shut down
+        if hosts is not None:
+            hosts.run = False
         time.sleep(1)
         self.socket.close()
-        self.hosts.flush()
-        if self.hosts.t:
-            self.hosts.t.join()
+        if hosts is not None:
+            hosts.flush()
+            if hosts.t:
+                hosts.t.join()
         for transaction in list(self.sessions.values()):
             transaction.close()
         logger.success("Closed")